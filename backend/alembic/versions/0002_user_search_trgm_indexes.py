@@ -0,0 +1,43 @@
+"""Add trigram indexes for user search
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-01-01 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The admin search runs ILIKE '%term%' across these four columns;
+    # trigram GIN indexes let the planner probe instead of seq-scanning
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX ix_users_email_trgm ON users "
+        "USING gin (email gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX ix_users_username_trgm ON users "
+        "USING gin (username gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX ix_users_first_name_trgm ON users "
+        "USING gin (first_name gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE INDEX ix_users_last_name_trgm ON users "
+        "USING gin (last_name gin_trgm_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_last_name_trgm', table_name='users')
+    op.drop_index('ix_users_first_name_trgm', table_name='users')
+    op.drop_index('ix_users_username_trgm', table_name='users')
+    op.drop_index('ix_users_email_trgm', table_name='users')
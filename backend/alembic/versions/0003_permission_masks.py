@@ -0,0 +1,34 @@
+"""Add denormalized permission masks to users and roles
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-01-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Masks start at zero; PermissionService recomputes them whenever role
+    # memberships or role permissions change, and permission checks fall
+    # back to the relational tables while a mask is still zero
+    op.add_column(
+        'roles',
+        sa.Column('permission_mask', sa.BigInteger(), nullable=False, server_default='0')
+    )
+    op.add_column(
+        'users',
+        sa.Column('permission_mask', sa.BigInteger(), nullable=False, server_default='0')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'permission_mask')
+    op.drop_column('roles', 'permission_mask')
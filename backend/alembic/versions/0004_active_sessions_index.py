@@ -0,0 +1,31 @@
+"""Add partial index on active user sessions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-01-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Session invalidation (deactivate_user, logout-all) always filters on
+    # user_id AND is_active; the partial index keeps it an index scan over
+    # just the live rows
+    op.create_index(
+        'ix_user_sessions_user_id_active',
+        'user_sessions',
+        ['user_id'],
+        postgresql_where=sa.text('is_active')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_sessions_user_id_active', table_name='user_sessions')
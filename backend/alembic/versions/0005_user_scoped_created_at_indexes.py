@@ -0,0 +1,42 @@
+"""Add composite user_id/created_at indexes for per-user history queries
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-01-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Audit logs, sessions and API keys are all listed per user ordered by
+    # created_at DESC; the composite indexes turn those ORDER BYs into
+    # index scans instead of per-page sorts of the full history
+    op.create_index(
+        'ix_audit_logs_user_id_created_at',
+        'audit_logs',
+        ['user_id', sa.text('created_at DESC')]
+    )
+    op.create_index(
+        'ix_user_sessions_user_id_created_at',
+        'user_sessions',
+        ['user_id', sa.text('created_at DESC')]
+    )
+    op.create_index(
+        'ix_api_keys_user_id_created_at',
+        'api_keys',
+        ['user_id', sa.text('created_at DESC')]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_api_keys_user_id_created_at', table_name='api_keys')
+    op.drop_index('ix_user_sessions_user_id_created_at', table_name='user_sessions')
+    op.drop_index('ix_audit_logs_user_id_created_at', table_name='audit_logs')
@@ -1,16 +1,17 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, Generator, Optional
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, AsyncSessionLocal
 from app.core.security import verify_token
 from app.models.user import User
 from app.services.auth_service import AuthService
 import redis
 from app.core.config import settings
 
-# Security scheme
-security = HTTPBearer()
+# Security scheme; auto_error would answer missing credentials with 403,
+# but a missing or malformed Authorization header is a 401
+security = HTTPBearer(auto_error=False)
 
 # Redis client for rate limiting
 redis_client = redis.from_url(settings.REDIS_URL)
@@ -25,12 +26,25 @@ def get_db() -> Generator:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator:
+    """Get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def get_current_user(
     db: Session = Depends(get_db),
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
     """Get current authenticated user"""
-    
+
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     # Verify token
     user_id = verify_token(credentials.credentials)
     if user_id is None:
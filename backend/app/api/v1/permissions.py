@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, Dict, List
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from app.api import deps
@@ -41,6 +41,19 @@ def create_permission(
     return permission
 
 
+@router.post("/check", response_model=Dict[str, bool])
+def check_permissions(
+    *,
+    db: Session = Depends(deps.get_db),
+    permission_names: List[str],
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """Check which of the given permissions the current user has"""
+
+    permission_service = PermissionService(db)
+    return permission_service.check_user_permissions(current_user.id, permission_names)
+
+
 @router.get("/{permission_id}", response_model=PermissionSchema)
 def read_permission(
     *,
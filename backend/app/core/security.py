@@ -3,8 +3,14 @@ from typing import Any, Union, Optional
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from passlib.hash import bcrypt
+from cachetools import TTLCache
+import enum
+import hashlib
+import hmac
 import secrets
 import re
+import threading
+import time
 from app.core.config import settings
 
 # Password hashing
@@ -34,18 +40,41 @@ def create_refresh_token(subject: Union[str, Any]) -> str:
     return encoded_jwt
 
 
+# Short-TTL cache of successful verifications, keyed by token digest so
+# full tokens never sit in memory. Only positive results are cached, and
+# the stored exp is still honoured, so expired or invalid tokens always
+# take the full decode path. TTLCache is not thread-safe and this runs on
+# threadpool threads, so every access goes through the lock.
+_token_cache: TTLCache = TTLCache(maxsize=10000, ttl=5)
+_token_cache_lock = threading.Lock()
+
+
 def verify_token(token: str, token_type: str = "access") -> Optional[str]:
     """Verify JWT token and return subject"""
+    if not token:
+        return None
+
+    cache_key = (hashlib.sha256(token.encode()).digest(), token_type)
+    with _token_cache_lock:
+        cached = _token_cache.get(cache_key)
+    if cached is not None:
+        token_sub, expires = cached
+        # exp is epoch seconds in UTC, so compare against time.time()
+        if expires > time.time():
+            return token_sub
+
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
         )
         token_sub: str = payload.get("sub")
         token_type_claim: str = payload.get("type")
-        
+
         if token_sub is None or token_type_claim != token_type:
             return None
-        
+
+        with _token_cache_lock:
+            _token_cache[cache_key] = (token_sub, payload["exp"])
         return token_sub
     except JWTError:
         return None
@@ -61,42 +90,76 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def validate_password_strength(password: str) -> tuple[bool, list[str]]:
+# Common weak passwords; a frozenset built once at import makes the
+# blocklist check an O(1) membership test
+WEAK_PASSWORDS = frozenset({
+    "password", "123456", "password123", "admin", "qwerty",
+    "letmein", "welcome", "monkey", "dragon", "master",
+})
+
+
+class PasswordError(enum.IntFlag):
+    """Bitmask of password strength violations
+
+    Flags combine with | and test with `in`; `.messages` renders the
+    user-facing strings for API responses.
+    """
+    TOO_SHORT = enum.auto()
+    NO_UPPERCASE = enum.auto()
+    NO_LOWERCASE = enum.auto()
+    NO_NUMBER = enum.auto()
+    NO_SPECIAL = enum.auto()
+    COMMON = enum.auto()
+
+    @property
+    def messages(self) -> list[str]:
+        return [_PASSWORD_ERROR_MESSAGES[flag] for flag in PasswordError if flag in self]
+
+
+_PASSWORD_ERROR_MESSAGES = {
+    PasswordError.TOO_SHORT: (
+        f"Password must be at least {settings.PASSWORD_MIN_LENGTH} characters long"
+    ),
+    PasswordError.NO_UPPERCASE: "Password must contain at least one uppercase letter",
+    PasswordError.NO_LOWERCASE: "Password must contain at least one lowercase letter",
+    PasswordError.NO_NUMBER: "Password must contain at least one number",
+    PasswordError.NO_SPECIAL: "Password must contain at least one special character",
+    PasswordError.COMMON: "Password is too common and easily guessable",
+}
+
+
+def validate_password_strength(password: str) -> tuple[bool, PasswordError]:
     """
     Validate password strength based on security requirements
-    Returns (is_valid, list_of_errors)
+    Returns (is_valid, PasswordError bitmask of violations)
     """
-    errors = []
-    
+    errors = PasswordError(0)
+
     # Check minimum length
     if len(password) < settings.PASSWORD_MIN_LENGTH:
-        errors.append(f"Password must be at least {settings.PASSWORD_MIN_LENGTH} characters long")
-    
+        errors |= PasswordError.TOO_SHORT
+
     # Check for uppercase letter
     if settings.PASSWORD_REQUIRE_UPPERCASE and not re.search(r"[A-Z]", password):
-        errors.append("Password must contain at least one uppercase letter")
-    
+        errors |= PasswordError.NO_UPPERCASE
+
     # Check for lowercase letter
     if settings.PASSWORD_REQUIRE_LOWERCASE and not re.search(r"[a-z]", password):
-        errors.append("Password must contain at least one lowercase letter")
-    
+        errors |= PasswordError.NO_LOWERCASE
+
     # Check for numbers
     if settings.PASSWORD_REQUIRE_NUMBERS and not re.search(r"\d", password):
-        errors.append("Password must contain at least one number")
-    
+        errors |= PasswordError.NO_NUMBER
+
     # Check for special characters
     if settings.PASSWORD_REQUIRE_SPECIAL and not re.search(r"[!@#$%^&*(),.?\":{}|<>]", password):
-        errors.append("Password must contain at least one special character")
-    
+        errors |= PasswordError.NO_SPECIAL
+
     # Check for common weak passwords
-    weak_passwords = [
-        "password", "123456", "password123", "admin", "qwerty",
-        "letmein", "welcome", "monkey", "dragon", "master"
-    ]
-    if password.lower() in weak_passwords:
-        errors.append("Password is too common and easily guessable")
-    
-    return len(errors) == 0, errors
+    if password.lower() in WEAK_PASSWORDS:
+        errors |= PasswordError.COMMON
+
+    return not errors, errors
 
 
 def generate_password_reset_token() -> str:
@@ -121,9 +184,14 @@ def create_session_token() -> str:
 
 def hash_api_key(api_key: str) -> str:
     """Hash an API key for storage"""
-    return get_password_hash(api_key)
+    # API keys are high-entropy random tokens, so a keyed HMAC-SHA256 is
+    # enough — no need for a slow password KDF on the request path, and the
+    # deterministic digest doubles as an indexed lookup key
+    return hmac.new(
+        settings.SECRET_KEY.encode(), api_key.encode(), hashlib.sha256
+    ).hexdigest()
 
 
 def verify_api_key(plain_api_key: str, hashed_api_key: str) -> bool:
     """Verify an API key against its hash"""
-    return verify_password(plain_api_key, hashed_api_key)
+    return hmac.compare_digest(hash_api_key(plain_api_key), hashed_api_key)
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
@@ -10,5 +11,28 @@ engine = create_engine(
     echo=settings.DEBUG
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async engine (asyncpg) for endpoints being migrated off the sync
+# threadpool; shares pool settings with the sync engine above
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    echo=settings.DEBUG
+)
+
+# Create session factory. expire_on_commit=False keeps loaded instances
+# usable after commit, so response serialization does not trigger a
+# redundant refresh SELECT (e.g. the User returned from a login).
+SessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=engine
+)
+
+# Async session factory
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine
+)
@@ -1,5 +1,6 @@
 from fastapi import Request, HTTPException, status
-from fastapi.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
 import re
 import json
 import logging
@@ -65,13 +66,29 @@ class InputSanitizationMiddleware(BaseHTTPMiddleware):
         if content_type.startswith("multipart/form-data"):
             return await call_next(request)
         
-        # Validate URL path and query parameters
-        self.validate_url(request)
-        
-        # Validate request body for JSON requests
-        if content_type.startswith("application/json"):
-            await self.validate_json_body(request)
-        
+        # HTTPException raised this far out in the middleware stack would
+        # bypass the app's exception handlers, so translate it here
+        try:
+            # Validate URL path and query parameters
+            self.validate_url(request)
+
+            # Validate request body for JSON requests
+            if content_type.startswith("application/json"):
+                body = await request.body()
+                self.validate_json_body(body)
+
+                # Replay the consumed body stream for the downstream app,
+                # otherwise the endpoint blocks waiting for it
+                async def receive() -> Dict[str, Any]:
+                    return {"type": "http.request", "body": body}
+
+                request = Request(request.scope, receive)
+        except HTTPException as exc:
+            return JSONResponse(
+                status_code=exc.status_code,
+                content={"detail": exc.detail}
+            )
+
         return await call_next(request)
     
     def validate_url(self, request: Request):
@@ -99,12 +116,10 @@ class InputSanitizationMiddleware(BaseHTTPMiddleware):
                         detail="Invalid query parameters"
                     )
     
-    async def validate_json_body(self, request: Request):
+    def validate_json_body(self, body: bytes):
         """Validate JSON request body"""
-        
+
         try:
-            # Read body
-            body = await request.body()
             if not body:
                 return
             
@@ -225,9 +240,9 @@ class ContentTypeValidationMiddleware(BaseHTTPMiddleware):
         # Check for dangerous content types
         if base_content_type in self.dangerous_content_types:
             logger.warning(f"Dangerous content type detected: {base_content_type}")
-            raise HTTPException(
+            return JSONResponse(
                 status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-                detail="Unsupported or dangerous content type"
+                content={"detail": "Unsupported or dangerous content type"}
             )
         
         # For file uploads, be more restrictive
@@ -236,9 +251,9 @@ class ContentTypeValidationMiddleware(BaseHTTPMiddleware):
             pass
         elif base_content_type not in self.allowed_content_types:
             logger.warning(f"Unsupported content type: {base_content_type}")
-            raise HTTPException(
+            return JSONResponse(
                 status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
-                detail="Unsupported content type"
+                content={"detail": "Unsupported content type"}
             )
         
         return await call_next(request)
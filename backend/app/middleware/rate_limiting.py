@@ -1,5 +1,6 @@
 from fastapi import Request, HTTPException, status
-from fastapi.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
 import redis
 import time
 import json
@@ -35,9 +36,9 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             
             # Check rate limit
             if not await self.check_rate_limit(client_id, rate_limit_config):
-                raise HTTPException(
+                return JSONResponse(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Rate limit exceeded. Please try again later.",
+                    content={"detail": "Rate limit exceeded. Please try again later."},
                     headers={"Retry-After": str(rate_limit_config["window"])}
                 )
         
@@ -233,9 +234,9 @@ class IPWhitelistMiddleware(BaseHTTPMiddleware):
             
             if client_ip not in self.whitelist:
                 logger.warning(f"Blocked admin access from non-whitelisted IP: {client_ip}")
-                raise HTTPException(
+                return JSONResponse(
                     status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Access denied: IP not whitelisted for admin access"
+                    content={"detail": "Access denied: IP not whitelisted for admin access"}
                 )
         
         return await call_next(request)
@@ -264,9 +265,9 @@ class RequestValidationMiddleware(BaseHTTPMiddleware):
         # Check request size
         content_length = request.headers.get("content-length")
         if content_length and int(content_length) > self.max_request_size:
-            raise HTTPException(
+            return JSONResponse(
                 status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="Request entity too large"
+                content={"detail": "Request entity too large"}
             )
         
         # Check for suspicious patterns in URL
@@ -281,9 +282,9 @@ class RequestValidationMiddleware(BaseHTTPMiddleware):
         for pattern in suspicious_patterns:
             if pattern in url_path or pattern in query_string:
                 logger.warning(f"Suspicious request pattern detected: {pattern} in {request.url}")
-                raise HTTPException(
+                return JSONResponse(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid request"
+                    content={"detail": "Invalid request"}
                 )
         
         return await call_next(request)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Table
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Table
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base_class import Base
+from datetime import datetime
 import uuid
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -37,6 +38,11 @@ class User(Base):
     is_verified = Column(Boolean, default=False)
     is_superuser = Column(Boolean, default=False)
     
+    # Denormalized OR of the permission masks of this user's roles;
+    # maintained by PermissionService, relational tables stay the source
+    # of truth
+    permission_mask = Column(BigInteger, default=0, nullable=False)
+
     # Security fields
     failed_login_attempts = Column(Integer, default=0)
     locked_until = Column(DateTime, nullable=True)
@@ -46,7 +52,7 @@ class User(Base):
     # Two-factor authentication
     is_2fa_enabled = Column(Boolean, default=False)
     totp_secret = Column(String, nullable=True)
-    backup_codes = Column(Text, nullable=True)  # JSON string of backup codes
+    backup_codes = Column(Text, nullable=True)  # Newline-separated SHA-256 hashes of backup codes
     
     # Profile information
     phone_number = Column(String, nullable=True)
@@ -78,7 +84,7 @@ class User(Base):
     def is_locked(self) -> bool:
         if self.locked_until is None:
             return False
-        return self.locked_until > func.now()
+        return self.locked_until > datetime.utcnow()
     
     def has_permission(self, permission_name: str) -> bool:
         """Check if user has a specific permission"""
@@ -100,6 +106,10 @@ class Role(Base):
     name = Column(String, unique=True, index=True, nullable=False)
     description = Column(Text, nullable=True)
     is_system_role = Column(Boolean, default=False)  # System roles cannot be deleted
+
+    # Bitmask over the default permission set (see PermissionService);
+    # custom permissions have no bit and fall back to the relational path
+    permission_mask = Column(BigInteger, default=0, nullable=False)
     
     # Timestamps
     created_at = Column(DateTime, default=func.now())
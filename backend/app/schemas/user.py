@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, validator, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, model_validator
 from typing import Optional, List
 from datetime import datetime
 from uuid import UUID
@@ -21,12 +21,12 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str = Field(..., min_length=8)
     confirm_password: str
-    
-    @validator('confirm_password')
-    def passwords_match(cls, v, values, **kwargs):
-        if 'password' in values and v != values['password']:
+
+    @model_validator(mode='after')
+    def passwords_match(self):
+        if self.confirm_password != self.password:
             raise ValueError('Passwords do not match')
-        return v
+        return self
 
 
 # User Update Schema
@@ -47,12 +47,12 @@ class PasswordChange(BaseModel):
     current_password: str
     new_password: str = Field(..., min_length=8)
     confirm_password: str
-    
-    @validator('confirm_password')
-    def passwords_match(cls, v, values, **kwargs):
-        if 'new_password' in values and v != values['new_password']:
+
+    @model_validator(mode='after')
+    def passwords_match(self):
+        if self.confirm_password != self.new_password:
             raise ValueError('Passwords do not match')
-        return v
+        return self
 
 
 # Password Reset Schema
@@ -60,36 +60,31 @@ class PasswordReset(BaseModel):
     token: str
     new_password: str = Field(..., min_length=8)
     confirm_password: str
-    
-    @validator('confirm_password')
-    def passwords_match(cls, v, values, **kwargs):
-        if 'new_password' in values and v != values['new_password']:
+
+    @model_validator(mode='after')
+    def passwords_match(self):
+        if self.confirm_password != self.new_password:
             raise ValueError('Passwords do not match')
-        return v
+        return self
 
 
-# User Response Schema
-class User(UserBase):
+# Permission Schemas
+class PermissionBase(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    description: Optional[str] = None
+    resource: str = Field(..., min_length=1, max_length=50)
+    action: str = Field(..., min_length=1, max_length=50)
+
+
+class PermissionCreate(PermissionBase):
+    pass
+
+
+class Permission(PermissionBase):
     id: UUID
-    is_verified: bool
-    is_superuser: bool
-    is_2fa_enabled: bool
-    last_login: Optional[datetime]
     created_at: datetime
-    updated_at: datetime
-    roles: List['Role'] = []
-    
-    class Config:
-        from_attributes = True
 
-
-# User List Response Schema
-class UserList(BaseModel):
-    users: List[User]
-    total: int
-    page: int
-    size: int
-    pages: int
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 # Role Schemas
@@ -113,30 +108,32 @@ class Role(RoleBase):
     is_system_role: bool
     created_at: datetime
     updated_at: datetime
-    permissions: List['Permission'] = []
-    
-    class Config:
-        from_attributes = True
+    permissions: List[Permission] = []
 
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
-# Permission Schemas
-class PermissionBase(BaseModel):
-    name: str = Field(..., min_length=1, max_length=100)
-    description: Optional[str] = None
-    resource: str = Field(..., min_length=1, max_length=50)
-    action: str = Field(..., min_length=1, max_length=50)
 
+# User Response Schema
+class User(UserBase):
+    id: UUID
+    is_verified: bool
+    is_superuser: bool
+    is_2fa_enabled: bool
+    last_login: Optional[datetime]
+    created_at: datetime
+    updated_at: datetime
+    roles: List[Role] = []
 
-class PermissionCreate(PermissionBase):
-    pass
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
-class Permission(PermissionBase):
-    id: UUID
-    created_at: datetime
-    
-    class Config:
-        from_attributes = True
+# User List Response Schema
+class UserList(BaseModel):
+    users: List[User]
+    total: int
+    page: int
+    size: int
+    pages: int
 
 
 # Authentication Schemas
@@ -197,9 +194,8 @@ class APIKey(APIKeyBase):
     usage_count: int
     is_active: bool
     created_at: datetime
-    
-    class Config:
-        from_attributes = True
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class APIKeyResponse(BaseModel):
@@ -216,9 +212,8 @@ class UserSession(BaseModel):
     is_active: bool
     last_activity: datetime
     created_at: datetime
-    
-    class Config:
-        from_attributes = True
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 # Audit Log Schemas
@@ -234,11 +229,6 @@ class AuditLog(BaseModel):
     details: Optional[str]
     status: str
     created_at: datetime
-    
-    class Config:
-        from_attributes = True
 
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
-# Update forward references
-User.model_rebuild()
-Role.model_rebuild()
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from app.models.user import User, UserSession, AuditLog
@@ -15,22 +16,44 @@ from app.core.security import (
 from app.core.config import settings
 from app.schemas.user import UserCreate, LoginRequest
 import pyotp
-import qrcode
+import segno
+import hashlib
+import hmac
 import io
 import base64
 import secrets
 import json
 
+# Narrow column set for the hot email lookup in authenticate_user; loading
+# the full User entity is deferred until the password check has passed
+AUTH_COLS = (
+    User.id,
+    User.hashed_password,
+    User.is_active,
+    User.locked_until,
+    User.failed_login_attempts,
+)
+
 
 class AuthService:
+    # Instantiated once per request by the DI layer, so keep the
+    # per-instance footprint minimal
+    __slots__ = ("db",)
+
     def __init__(self, db: Session):
         self.db = db
     
     def authenticate_user(self, email: str, password: str, ip_address: str = None, user_agent: str = None) -> Optional[User]:
         """Authenticate user with email and password"""
-        user = self.db.query(User).filter(User.email == email).first()
-        
-        if not user:
+        # One timestamp per attempt keeps lockout math and audit records
+        # consistent within the transaction
+        now = datetime.utcnow()
+
+        row = self.db.execute(
+            select(*AUTH_COLS).where(User.email == email)
+        ).first()
+
+        if not row:
             # Log failed login attempt
             self._log_audit_event(
                 action="login_failed",
@@ -42,9 +65,9 @@ class AuthService:
             return None
         
         # Check if account is locked
-        if user.is_locked:
+        if row.locked_until is not None and row.locked_until > now:
             self._log_audit_event(
-                user_id=user.id,
+                user_id=row.id,
                 action="login_failed",
                 details={"reason": "account_locked"},
                 ip_address=ip_address,
@@ -57,9 +80,9 @@ class AuthService:
             )
         
         # Check if account is active
-        if not user.is_active:
+        if not row.is_active:
             self._log_audit_event(
-                user_id=user.id,
+                user_id=row.id,
                 action="login_failed",
                 details={"reason": "account_inactive"},
                 ip_address=ip_address,
@@ -72,28 +95,30 @@ class AuthService:
             )
         
         # Verify password
-        if not verify_password(password, user.hashed_password):
+        if not verify_password(password, row.hashed_password):
             # Increment failed login attempts
-            user.failed_login_attempts += 1
-            
+            failed_attempts = row.failed_login_attempts + 1
+            values = {"failed_login_attempts": failed_attempts}
+
             # Lock account if too many failed attempts
-            if user.failed_login_attempts >= settings.MAX_LOGIN_ATTEMPTS:
-                user.locked_until = datetime.utcnow() + timedelta(
+            if failed_attempts >= settings.MAX_LOGIN_ATTEMPTS:
+                values["locked_until"] = now + timedelta(
                     minutes=settings.ACCOUNT_LOCKOUT_DURATION_MINUTES
                 )
                 self._log_audit_event(
-                    user_id=user.id,
+                    user_id=row.id,
                     action="account_locked",
                     details={"reason": "too_many_failed_attempts"},
                     ip_address=ip_address,
                     user_agent=user_agent,
                     status="success"
                 )
-            
+
+            self.db.execute(update(User).where(User.id == row.id).values(**values))
             self.db.commit()
-            
+
             self._log_audit_event(
-                user_id=user.id,
+                user_id=row.id,
                 action="login_failed",
                 details={"reason": "invalid_password"},
                 ip_address=ip_address,
@@ -101,13 +126,15 @@ class AuthService:
                 status="failure"
             )
             return None
-        
-        # Reset failed login attempts on successful authentication
+
+        # Password verified: load the full entity for the caller and reset
+        # the failure counters on it
+        user = self.db.query(User).filter(User.id == row.id).first()
         user.failed_login_attempts = 0
         user.locked_until = None
-        user.last_login = datetime.utcnow()
+        user.last_login = now
         self.db.commit()
-        
+
         self._log_audit_event(
             user_id=user.id,
             action="login_success",
@@ -115,7 +142,7 @@ class AuthService:
             user_agent=user_agent,
             status="success"
         )
-        
+
         return user
     
     def create_user_session(self, user: User, ip_address: str = None, user_agent: str = None, remember_me: bool = False) -> Tuple[str, str]:
@@ -127,9 +154,10 @@ class AuthService:
         refresh_token = create_refresh_token(subject=str(user.id))
         
         # Create session record
-        session_expires = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        now = datetime.utcnow()
+        session_expires = now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
         if remember_me:
-            session_expires = datetime.utcnow() + timedelta(days=30)  # Extended session
+            session_expires = now + timedelta(days=30)  # Extended session
         
         session = UserSession(
             user_id=user.id,
@@ -152,17 +180,18 @@ class AuthService:
             return None
         
         # Verify session exists and is active
+        now = datetime.utcnow()
         session = self.db.query(UserSession).filter(
             UserSession.refresh_token == refresh_token,
             UserSession.is_active == True,
-            UserSession.expires_at > datetime.utcnow()
+            UserSession.expires_at > now
         ).first()
-        
+
         if not session:
             return None
-        
+
         # Update session activity
-        session.last_activity = datetime.utcnow()
+        session.last_activity = now
         self.db.commit()
         
         # Create new access token
@@ -195,16 +224,12 @@ class AuthService:
     
     def logout_all_sessions(self, user_id: str) -> int:
         """Logout user from all sessions"""
-        sessions = self.db.query(UserSession).filter(
+        stmt = update(UserSession).where(
             UserSession.user_id == user_id,
             UserSession.is_active == True
-        ).all()
-        
-        count = 0
-        for session in sessions:
-            session.is_active = False
-            count += 1
-        
+        ).values(is_active=False).execution_options(synchronize_session=False)
+
+        count = self.db.execute(stmt).rowcount
         self.db.commit()
         
         self._log_audit_event(
@@ -220,7 +245,9 @@ class AuthService:
         """Register a new user"""
         
         # Check if user already exists
-        existing_user = self.db.query(User).filter(User.email == user_data.email).first()
+        existing_user = self.db.execute(
+            select(User.id).where(User.email == user_data.email)
+        ).first()
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -232,7 +259,7 @@ class AuthService:
         if not is_valid:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail={"message": "Password does not meet security requirements", "errors": errors}
+                detail={"message": "Password does not meet security requirements", "errors": errors.messages}
             )
         
         # Create user
@@ -278,7 +305,7 @@ class AuthService:
         if not is_valid:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail={"message": "New password does not meet security requirements", "errors": errors}
+                detail={"message": "New password does not meet security requirements", "errors": errors.messages}
             )
         
         # Update password
@@ -334,21 +361,20 @@ class AuthService:
             issuer_name=settings.TOTP_ISSUER
         )
 
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(totp_uri)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill_color="black", back_color="white")
+        qr = segno.make(totp_uri, error='m')
         buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
+        qr.save(buffer, kind='png', scale=5)
         qr_code_data = base64.b64encode(buffer.getvalue()).decode()
 
-        # Generate backup codes
-        backup_codes = [secrets.token_hex(4).upper() for _ in range(10)]
+        # Generate backup codes from a single CSPRNG draw (4 bytes per code)
+        raw = secrets.token_bytes(40)
+        backup_codes = [raw[i * 4:(i + 1) * 4].hex().upper() for i in range(10)]
 
-        # Store secret temporarily (will be confirmed when user verifies)
+        # Store secret temporarily (will be confirmed when user verifies).
+        # Backup codes are password-equivalents, so only their hashes are
+        # persisted; the plain codes are shown to the user once.
         user.totp_secret = secret
-        user.backup_codes = json.dumps(backup_codes)
+        user.backup_codes = "\n".join(self._hash_backup_code(code) for code in backup_codes)
         self.db.commit()
 
         return {
@@ -384,30 +410,39 @@ class AuthService:
         if not user.is_2fa_enabled or not user.totp_secret:
             return False
 
-        # Check TOTP code
-        totp = pyotp.TOTP(user.totp_secret)
-        if totp.verify(code):
-            return True
+        # Check TOTP code. Codes are exactly six digits, so trivially
+        # malformed input is rejected before any HMAC work; valid_window=1
+        # tolerates one 30s step of clock drift.
+        if len(code) == 6 and code.isdigit():
+            totp = pyotp.TOTP(user.totp_secret)
+            if totp.verify(code, valid_window=1):
+                return True
 
-        # Check backup codes
+        # Check backup codes (stored as newline-separated SHA-256 hashes)
         if user.backup_codes:
-            backup_codes = json.loads(user.backup_codes)
-            if code.upper() in backup_codes:
+            code_hash = self._hash_backup_code(code.upper())
+            hashes = frozenset(user.backup_codes.splitlines())
+            if any(hmac.compare_digest(code_hash, stored) for stored in hashes):
                 # Remove used backup code
-                backup_codes.remove(code.upper())
-                user.backup_codes = json.dumps(backup_codes)
+                remaining = hashes - {code_hash}
+                user.backup_codes = "\n".join(remaining) if remaining else None
                 self.db.commit()
 
                 self._log_audit_event(
                     user_id=user.id,
                     action="2fa_backup_code_used",
-                    details={"remaining_codes": len(backup_codes)},
+                    details={"remaining_codes": len(remaining)},
                     status="success"
                 )
                 return True
 
         return False
 
+    @staticmethod
+    def _hash_backup_code(code: str) -> str:
+        """Hash a 2FA backup code for storage"""
+        return hashlib.sha256(code.encode()).hexdigest()
+
     def disable_2fa(self, user: User, password: str, code: str) -> bool:
         """Disable two-factor authentication"""
         if not user.is_2fa_enabled:
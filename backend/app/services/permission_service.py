@@ -1,10 +1,53 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
+from collections import defaultdict
+from typing import FrozenSet, List, Optional, Dict, Any
+from cachetools import TTLCache
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, raiseload, selectinload
 from fastapi import HTTPException, status
-from app.models.user import User, Role, Permission
+from app.models.user import User, Role, Permission, role_permissions, user_roles
 from app.schemas.user import RoleCreate, RoleUpdate, PermissionCreate
+import threading
 import uuid
 
+# Process-local cache of resolved permission names per user. Module-level so
+# it survives the per-request PermissionService instances; the short TTL
+# bounds staleness for anything the explicit invalidation hooks miss.
+# TTLCache is not thread-safe and requests run on threadpool threads, so
+# every access goes through the lock.
+_permission_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_permission_cache_lock = threading.Lock()
+
+# Default system permissions
+DEFAULT_PERMISSIONS = [
+    # User management
+    {"name": "users.create", "description": "Create users", "resource": "users", "action": "create"},
+    {"name": "users.read", "description": "Read users", "resource": "users", "action": "read"},
+    {"name": "users.update", "description": "Update users", "resource": "users", "action": "update"},
+    {"name": "users.delete", "description": "Delete users", "resource": "users", "action": "delete"},
+
+    # Role management
+    {"name": "roles.create", "description": "Create roles", "resource": "roles", "action": "create"},
+    {"name": "roles.read", "description": "Read roles", "resource": "roles", "action": "read"},
+    {"name": "roles.update", "description": "Update roles", "resource": "roles", "action": "update"},
+    {"name": "roles.delete", "description": "Delete roles", "resource": "roles", "action": "delete"},
+
+    # Permission management
+    {"name": "permissions.create", "description": "Create permissions", "resource": "permissions", "action": "create"},
+    {"name": "permissions.read", "description": "Read permissions", "resource": "permissions", "action": "read"},
+    {"name": "permissions.delete", "description": "Delete permissions", "resource": "permissions", "action": "delete"},
+
+    # System administration
+    {"name": "system.admin", "description": "System administration", "resource": "system", "action": "admin"},
+    {"name": "audit.read", "description": "Read audit logs", "resource": "audit", "action": "read"},
+]
+
+# One bit per default permission; bit positions are stable because new
+# entries must only ever be appended to DEFAULT_PERMISSIONS
+PERMISSION_BITS = {
+    perm["name"]: 1 << i for i, perm in enumerate(DEFAULT_PERMISSIONS)
+}
+
 
 class PermissionService:
     def __init__(self, db: Session):
@@ -55,11 +98,77 @@ class PermissionService:
         permission = self.get_permission_by_id(permission_id)
         if not permission:
             return False
-        
+
+        affected_role_ids = [
+            role_id for (role_id,) in self.db.query(role_permissions.c.role_id).filter(
+                role_permissions.c.permission_id == permission_id
+            )
+        ]
+
         self.db.delete(permission)
+        self.db.flush()
+
+        # Recompute masks for every role (and their users) that held the
+        # deleted permission
+        for role_id in affected_role_ids:
+            self._refresh_role_mask(role_id)
+        if affected_role_ids:
+            holder_ids = self.db.query(user_roles.c.user_id).filter(
+                user_roles.c.role_id.in_(affected_role_ids)
+            ).distinct().all()
+            for (holder_id,) in holder_ids:
+                self._refresh_user_mask(holder_id)
+
         self.db.commit()
+
+        # Any user may have held this permission through any role
+        with _permission_cache_lock:
+            _permission_cache.clear()
         return True
     
+    def _validate_permission_ids(self, permission_ids: List[uuid.UUID]) -> None:
+        """Ensure every given permission id exists, using a COUNT probe"""
+        count = self.db.query(func.count(Permission.id)).filter(
+            Permission.id.in_(permission_ids)
+        ).scalar()
+        if count != len(permission_ids):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="One or more permission IDs are invalid"
+            )
+
+    def _mask_for_names(self, permission_names) -> int:
+        """OR together the bits of the given default permission names"""
+        mask = 0
+        for name in permission_names:
+            mask |= PERMISSION_BITS.get(name, 0)
+        return mask
+
+    def _refresh_role_mask(self, role_id: uuid.UUID) -> None:
+        """Recompute a role's permission mask from its association rows"""
+        names = self.db.query(Permission.name).join(
+            role_permissions, Permission.id == role_permissions.c.permission_id
+        ).filter(role_permissions.c.role_id == role_id).all()
+
+        self.db.query(Role).filter(Role.id == role_id).update(
+            {"permission_mask": self._mask_for_names(n for (n,) in names)},
+            synchronize_session=False
+        )
+
+    def _refresh_user_mask(self, user_id: uuid.UUID) -> None:
+        """Recompute a user's permission mask as the OR of their role masks"""
+        masks = self.db.query(Role.permission_mask).join(
+            user_roles, Role.id == user_roles.c.role_id
+        ).filter(user_roles.c.user_id == user_id).all()
+
+        mask = 0
+        for (role_mask,) in masks:
+            mask |= role_mask or 0
+
+        self.db.query(User).filter(User.id == user_id).update(
+            {"permission_mask": mask}, synchronize_session=False
+        )
+
     # Role Management
     def create_role(self, role_data: RoleCreate) -> Role:
         """Create a new role with permissions"""
@@ -77,25 +186,25 @@ class PermissionService:
             name=role_data.name,
             description=role_data.description
         )
-        
+
         # Add permissions if provided
-        if role_data.permission_ids:
-            permissions = self.db.query(Permission).filter(
-                Permission.id.in_(role_data.permission_ids)
-            ).all()
-            
-            if len(permissions) != len(role_data.permission_ids):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="One or more permission IDs are invalid"
-                )
-            
-            role.permissions = permissions
-        
+        permission_ids = list(set(role_data.permission_ids or []))
+        if permission_ids:
+            self._validate_permission_ids(permission_ids)
+
         self.db.add(role)
+        if permission_ids:
+            # Flush to get the role id, then write the association rows
+            # directly instead of hydrating Permission objects
+            self.db.flush()
+            self.db.execute(
+                role_permissions.insert(),
+                [{"role_id": role.id, "permission_id": pid} for pid in permission_ids]
+            )
+            self._refresh_role_mask(role.id)
         self.db.commit()
         self.db.refresh(role)
-        
+
         return role
     
     def get_roles(self, skip: int = 0, limit: int = 100) -> List[Role]:
@@ -142,43 +251,69 @@ class PermissionService:
         
         # Update permissions
         if role_data.permission_ids is not None:
-            permissions = self.db.query(Permission).filter(
-                Permission.id.in_(role_data.permission_ids)
-            ).all()
-            
-            if len(permissions) != len(role_data.permission_ids):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="One or more permission IDs are invalid"
+            permission_ids = list(set(role_data.permission_ids))
+            if permission_ids:
+                self._validate_permission_ids(permission_ids)
+
+            # Replace the association rows wholesale
+            self.db.execute(
+                role_permissions.delete().where(role_permissions.c.role_id == role_id)
+            )
+            if permission_ids:
+                self.db.execute(
+                    role_permissions.insert(),
+                    [{"role_id": role_id, "permission_id": pid} for pid in permission_ids]
                 )
-            
-            role.permissions = permissions
-        
+            self.db.expire(role, ['permissions'])
+
+            # Keep the denormalized masks in step with the new association
+            # rows, for the role and for every user holding it
+            self._refresh_role_mask(role_id)
+            holder_ids = self.db.query(user_roles.c.user_id).filter(
+                user_roles.c.role_id == role_id
+            ).all()
+            for (holder_id,) in holder_ids:
+                self._refresh_user_mask(holder_id)
+
         self.db.commit()
         self.db.refresh(role)
-        
+
+        self._invalidate_role(role)
+
         return role
     
     def delete_role(self, role_id: uuid.UUID) -> bool:
         """Delete a role"""
-        role = self.get_role_by_id(role_id)
+        # Everything the delete path touches is eager-loaded up front;
+        # raiseload turns any stray lazy load into an error instead of a
+        # silent extra query
+        role = self.db.query(Role).options(
+            selectinload(Role.permissions),
+            raiseload('*')
+        ).filter(Role.id == role_id).first()
         if not role:
             return False
-        
+
         # Check if role is system role
         if role.is_system_role:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Cannot delete system role"
             )
-        
-        # Check if role is assigned to any users
-        if role.users:
+
+        # Check if role is assigned to any users with a scalar EXISTS probe
+        # instead of hydrating the user collection
+        has_users = self.db.query(
+            self.db.query(user_roles).filter(user_roles.c.role_id == role_id).exists()
+        ).scalar()
+        if has_users:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Cannot delete role that is assigned to users"
             )
-        
+
+        # No user holds the role at this point, so no cached permission
+        # sets need invalidating
         self.db.delete(role)
         self.db.commit()
         return True
@@ -186,112 +321,170 @@ class PermissionService:
     # User Role Management
     def assign_role_to_user(self, user_id: uuid.UUID, role_id: uuid.UUID) -> bool:
         """Assign a role to a user"""
-        user = self.db.query(User).filter(User.id == user_id).first()
-        role = self.db.query(Role).filter(Role.id == role_id).first()
-        
-        if not user or not role:
+        user_exists, role_exists = self.db.query(
+            self.db.query(User).filter(User.id == user_id).exists(),
+            self.db.query(Role).filter(Role.id == role_id).exists()
+        ).one()
+
+        if not user_exists or not role_exists:
             return False
-        
-        # Check if user already has this role
-        if role in user.roles:
-            return True
-        
-        user.roles.append(role)
+
+        # Idempotent association insert; no collection hydration needed
+        self.db.execute(
+            pg_insert(user_roles).values(
+                user_id=user_id, role_id=role_id
+            ).on_conflict_do_nothing()
+        )
+        self._refresh_user_mask(user_id)
         self.db.commit()
+        self._invalidate_user(user_id)
         return True
     
     def remove_role_from_user(self, user_id: uuid.UUID, role_id: uuid.UUID) -> bool:
         """Remove a role from a user"""
-        user = self.db.query(User).filter(User.id == user_id).first()
-        role = self.db.query(Role).filter(Role.id == role_id).first()
-        
-        if not user or not role:
+        user_exists, role_exists = self.db.query(
+            self.db.query(User).filter(User.id == user_id).exists(),
+            self.db.query(Role).filter(Role.id == role_id).exists()
+        ).one()
+
+        if not user_exists or not role_exists:
             return False
-        
-        # Check if user has this role
-        if role not in user.roles:
-            return True
-        
-        user.roles.remove(role)
+
+        # Targeted association delete instead of hydrating the user's whole
+        # role collection just to drop one row; removing an unassigned role
+        # is a no-op
+        self.db.execute(
+            user_roles.delete().where(
+                user_roles.c.user_id == user_id,
+                user_roles.c.role_id == role_id
+            )
+        )
+        self._refresh_user_mask(user_id)
         self.db.commit()
+        self._invalidate_user(user_id)
         return True
     
     def get_user_permissions(self, user_id: uuid.UUID) -> List[Permission]:
         """Get all permissions for a user through their roles"""
-        user = self.db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return []
-        
-        permissions = set()
-        for role in user.roles:
-            for permission in role.permissions:
-                permissions.add(permission)
-        
-        return list(permissions)
+        # Single DISTINCT join; the database de-duplicates permissions
+        # shared by overlapping roles instead of hydrating duplicates and
+        # set-folding them in Python
+        return self.db.query(Permission).join(
+            Permission.roles
+        ).join(Role.users).filter(User.id == user_id).distinct().all()
     
+    def _invalidate_user(self, user_id: uuid.UUID) -> None:
+        """Drop a user's cached permission names"""
+        with _permission_cache_lock:
+            _permission_cache.pop(user_id, None)
+
+    def _invalidate_role(self, role: Role) -> None:
+        """Drop cached permission names for every user holding a role"""
+        with _permission_cache_lock:
+            for user in role.users:
+                _permission_cache.pop(user.id, None)
+
+    def get_user_permission_names(self, user_id: uuid.UUID) -> FrozenSet[str]:
+        """Get the cached set of permission names for a user"""
+        with _permission_cache_lock:
+            cached = _permission_cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        rows = self.db.query(Permission.name).join(
+            Permission.roles
+        ).join(Role.users).filter(User.id == user_id).distinct().all()
+
+        names = frozenset(name for (name,) in rows)
+        with _permission_cache_lock:
+            _permission_cache[user_id] = names
+        return names
+
+    def get_users_permissions_for_many(self, user_ids: List[uuid.UUID]) -> Dict[uuid.UUID, FrozenSet[str]]:
+        """Resolve permission names for many users with a single query"""
+        ids = list(set(user_ids))
+        if not ids:
+            return {}
+
+        rows = self.db.query(
+            user_roles.c.user_id, Permission.name
+        ).select_from(user_roles).join(
+            Role, Role.id == user_roles.c.role_id
+        ).join(Role.permissions).filter(
+            user_roles.c.user_id.in_(ids)
+        ).distinct().all()
+
+        grouped: Dict[uuid.UUID, set] = defaultdict(set)
+        for user_id, name in rows:
+            grouped[user_id].add(name)
+
+        # Users without any roles still get an (empty) entry
+        return {user_id: frozenset(grouped[user_id]) for user_id in ids}
+
     def check_user_permission(self, user_id: uuid.UUID, permission_name: str) -> bool:
         """Check if user has a specific permission"""
-        user = self.db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return False
-        
-        return user.has_permission(permission_name)
-    
+        bit = PERMISSION_BITS.get(permission_name)
+        if bit is not None:
+            # Default permissions resolve with a single-row mask read and a
+            # bitwise AND instead of the role/permission joins
+            mask = self.db.query(User.permission_mask).filter(
+                User.id == user_id
+            ).scalar()
+            if mask and (mask & bit):
+                return True
+            # Only positive hits are trusted: rows predating migration
+            # 0003 (and roles assigned outside this service) carry stale
+            # masks, so a missing bit still falls through to the
+            # relational path instead of denying outright
+        return permission_name in self.get_user_permission_names(user_id)
+
+    def check_user_permissions(self, user_id: uuid.UUID, permission_names: List[str]) -> Dict[str, bool]:
+        """Check multiple permissions for a user at once"""
+        granted = self.get_user_permission_names(user_id)
+        return {name: name in granted for name in set(permission_names)}
+
     def check_user_role(self, user_id: uuid.UUID, role_name: str) -> bool:
         """Check if user has a specific role"""
-        user = self.db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return False
-        
-        return user.has_role(role_name)
+        return self.db.query(
+            self.db.query(Role)
+            .join(Role.users)
+            .filter(User.id == user_id, Role.name == role_name)
+            .exists()
+        ).scalar()
     
     # System Initialization
     def create_default_permissions(self) -> List[Permission]:
         """Create default system permissions"""
-        default_permissions = [
-            # User management
-            {"name": "users.create", "description": "Create users", "resource": "users", "action": "create"},
-            {"name": "users.read", "description": "Read users", "resource": "users", "action": "read"},
-            {"name": "users.update", "description": "Update users", "resource": "users", "action": "update"},
-            {"name": "users.delete", "description": "Delete users", "resource": "users", "action": "delete"},
-            
-            # Role management
-            {"name": "roles.create", "description": "Create roles", "resource": "roles", "action": "create"},
-            {"name": "roles.read", "description": "Read roles", "resource": "roles", "action": "read"},
-            {"name": "roles.update", "description": "Update roles", "resource": "roles", "action": "update"},
-            {"name": "roles.delete", "description": "Delete roles", "resource": "roles", "action": "delete"},
-            
-            # Permission management
-            {"name": "permissions.create", "description": "Create permissions", "resource": "permissions", "action": "create"},
-            {"name": "permissions.read", "description": "Read permissions", "resource": "permissions", "action": "read"},
-            {"name": "permissions.delete", "description": "Delete permissions", "resource": "permissions", "action": "delete"},
-            
-            # System administration
-            {"name": "system.admin", "description": "System administration", "resource": "system", "action": "admin"},
-            {"name": "audit.read", "description": "Read audit logs", "resource": "audit", "action": "read"},
-        ]
-        
-        created_permissions = []
-        for perm_data in default_permissions:
-            existing = self.db.query(Permission).filter(Permission.name == perm_data["name"]).first()
-            if not existing:
-                permission = Permission(**perm_data)
-                self.db.add(permission)
-                created_permissions.append(permission)
-        
+        # One idempotent bulk insert instead of a SELECT + INSERT per
+        # permission; concurrent workers bootstrapping at once just no-op
+        stmt = pg_insert(Permission).values(DEFAULT_PERMISSIONS).on_conflict_do_nothing(
+            index_elements=['name']
+        ).returning(Permission.id)
+        inserted_ids = [row.id for row in self.db.execute(stmt)]
         self.db.commit()
-        return created_permissions
+
+        if not inserted_ids:
+            return []
+        return self.db.query(Permission).filter(Permission.id.in_(inserted_ids)).all()
     
     def create_default_roles(self) -> List[Role]:
         """Create default system roles"""
         # Ensure default permissions exist
         self.create_default_permissions()
         
-        # Get all permissions
-        all_permissions = self.db.query(Permission).all()
-        user_permissions = [p for p in all_permissions if p.resource == "users" and p.action == "read"]
-        admin_permissions = all_permissions
-        
+        # Let the database partition the permission set per role, fetching
+        # only (id, name) pairs — the bootstrap never needs hydrated
+        # Permission entities
+        admin_permissions = self.db.query(Permission.id, Permission.name).all()
+        manager_permissions = self.db.query(Permission.id, Permission.name).filter(
+            Permission.resource.in_(["users", "roles"]),
+            Permission.action.in_(["create", "read", "update"])
+        ).all()
+        user_permissions = self.db.query(Permission.id, Permission.name).filter(
+            Permission.resource == "users",
+            Permission.action == "read"
+        ).all()
+
         default_roles = [
             {
                 "name": "Administrator",
@@ -302,7 +495,7 @@ class PermissionService:
             {
                 "name": "User Manager",
                 "description": "Manage users and basic operations",
-                "permissions": [p for p in all_permissions if p.resource in ["users", "roles"] and p.action in ["create", "read", "update"]],
+                "permissions": manager_permissions,
                 "is_system_role": True
             },
             {
@@ -314,17 +507,34 @@ class PermissionService:
         ]
         
         created_roles = []
+        created_perms = []
         for role_data in default_roles:
             existing = self.db.query(Role).filter(Role.name == role_data["name"]).first()
             if not existing:
                 role = Role(
                     name=role_data["name"],
                     description=role_data["description"],
-                    is_system_role=role_data["is_system_role"]
+                    is_system_role=role_data["is_system_role"],
+                    permission_mask=self._mask_for_names(
+                        name for _, name in role_data["permissions"]
+                    )
                 )
-                role.permissions = role_data["permissions"]
                 self.db.add(role)
                 created_roles.append(role)
-        
+                created_perms.append(role_data["permissions"])
+
+        if created_roles:
+            # Flush once for the role ids, then write every association in
+            # one multi-row INSERT instead of one per row via the ORM
+            self.db.flush()
+            self.db.execute(
+                role_permissions.insert(),
+                [
+                    {"role_id": role.id, "permission_id": pid}
+                    for role, perms in zip(created_roles, created_perms)
+                    for pid, _ in perms
+                ]
+            )
+
         self.db.commit()
         return created_roles
@@ -1,6 +1,7 @@
 from typing import List, Optional, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import func, or_, and_
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 from app.models.user import User, UserSession, APIKey, AuditLog
 from app.schemas.user import UserCreate, UserUpdate, APIKeyCreate, APIKeyResponse
@@ -9,6 +10,16 @@ from datetime import datetime
 import uuid
 import json
 
+# Columns the list and search endpoints actually serialize; hashed
+# passwords, TOTP secrets, backup codes and verification tokens never
+# leave the database on those paths
+USER_LIST_COLS = (
+    User.id, User.email, User.username, User.first_name, User.last_name,
+    User.phone_number, User.bio, User.timezone, User.language,
+    User.is_active, User.is_verified, User.is_superuser, User.is_2fa_enabled,
+    User.last_login, User.created_at, User.updated_at,
+)
+
 
 class UserService:
     def __init__(self, db: Session):
@@ -23,8 +34,12 @@ class UserService:
     ) -> Tuple[List[User], int]:
         """Get users with pagination and filtering"""
         
-        query = self.db.query(User)
-        
+        # Carry the total as a window-function column so the filter
+        # predicate is evaluated once for both the page and the count
+        query = self.db.query(User, func.count().over().label("total")).options(
+            load_only(*USER_LIST_COLS)
+        )
+
         # Apply filters
         if search:
             search_filter = or_(
@@ -34,16 +49,23 @@ class UserService:
                 User.username.ilike(f"%{search}%")
             )
             query = query.filter(search_filter)
-        
+
         if is_active is not None:
             query = query.filter(User.is_active == is_active)
-        
-        # Get total count
-        total = query.count()
-        
+
         # Apply pagination
-        users = query.offset(skip).limit(limit).all()
-        
+        rows = query.offset(skip).limit(limit).all()
+
+        users = [row[0] for row in rows]
+        if rows:
+            total = rows[0].total
+        elif skip:
+            # Paged past the end: fall back to a count so callers still
+            # see the real total
+            total = query.with_entities(func.count(User.id)).scalar()
+        else:
+            total = 0
+
         return users, total
     
     def get_user_by_id(self, user_id: uuid.UUID) -> Optional[User]:
@@ -61,28 +83,31 @@ class UserService:
     def create_user(self, user_data: UserCreate) -> User:
         """Create a new user"""
         
-        # Check if user already exists
-        existing_user = self.get_user_by_email(user_data.email)
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User with this email already exists"
-            )
-        
+        # Check if user already exists: one round-trip probes both fields,
+        # and the conflict is classified in Python
+        conditions = [User.email == user_data.email]
         if user_data.username:
-            existing_username = self.get_user_by_username(user_data.username)
-            if existing_username:
+            conditions.append(User.username == user_data.username)
+        conflict = self.db.query(User.email, User.username).filter(
+            or_(*conditions)
+        ).first()
+        if conflict:
+            if conflict.email == user_data.email:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="User with this username already exists"
+                    detail="User with this email already exists"
                 )
-        
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User with this username already exists"
+            )
+
         # Validate password strength
         is_valid, errors = validate_password_strength(user_data.password)
         if not is_valid:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail={"message": "Password does not meet security requirements", "errors": errors}
+                detail={"message": "Password does not meet security requirements", "errors": errors.messages}
             )
         
         # Create user
@@ -100,11 +125,20 @@ class UserService:
         )
         
         self.db.add(user)
-        self.db.commit()
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # The unique constraints close the race between the probe above
+            # and the commit
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User with this email or username already exists"
+            )
         self.db.refresh(user)
-        
+
         return user
-    
+
     def update_user(self, user_id: uuid.UUID, user_data: UserUpdate) -> Optional[User]:
         """Update user"""
         
@@ -112,32 +146,43 @@ class UserService:
         if not user:
             return None
         
-        # Check for email conflicts
+        # Check for email/username conflicts in a single round-trip
+        conditions = []
         if user_data.email and user_data.email != user.email:
-            existing_user = self.get_user_by_email(user_data.email)
-            if existing_user:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="User with this email already exists"
-                )
-        
-        # Check for username conflicts
+            conditions.append(User.email == user_data.email)
         if user_data.username and user_data.username != user.username:
-            existing_username = self.get_user_by_username(user_data.username)
-            if existing_username:
+            conditions.append(User.username == user_data.username)
+        if conditions:
+            conflict = self.db.query(User.email, User.username).filter(
+                or_(*conditions),
+                User.id != user_id
+            ).first()
+            if conflict:
+                if conflict.email == user_data.email:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="User with this email already exists"
+                    )
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="User with this username already exists"
                 )
-        
+
         # Update fields
         update_data = user_data.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(user, field, value)
-        
-        self.db.commit()
+
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User with this email or username already exists"
+            )
         self.db.refresh(user)
-        
+
         return user
     
     def delete_user(self, user_id: uuid.UUID) -> bool:
@@ -173,28 +218,32 @@ class UserService:
     
     def deactivate_user(self, user_id: uuid.UUID) -> bool:
         """Deactivate user account"""
-        
-        user = self.get_user_by_id(user_id)
-        if not user:
+
+        row = self.db.query(User.is_superuser).filter(User.id == user_id).first()
+        if not row:
             return False
-        
+
         # Check if user is superuser
-        if user.is_superuser:
+        if row.is_superuser:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Cannot deactivate superuser"
             )
-        
-        user.is_active = False
-        
+
+        # Two core UPDATEs in the same transaction; no entity hydration or
+        # dirty tracking on this latency-sensitive admin path
+        self.db.query(User).filter(User.id == user_id).update(
+            {"is_active": False}, synchronize_session=False
+        )
+
         # Invalidate all user sessions
         self.db.query(UserSession).filter(
             UserSession.user_id == user_id,
             UserSession.is_active == True
-        ).update({"is_active": False})
-        
+        ).update({"is_active": False}, synchronize_session=False)
+
         self.db.commit()
-        
+
         return True
     
     def get_user_sessions(self, user_id: uuid.UUID) -> List[UserSession]:
@@ -267,10 +316,18 @@ class UserService:
     
     def get_user_audit_logs(self, user_id: uuid.UUID, skip: int = 0, limit: int = 100) -> List[AuditLog]:
         """Get user audit logs"""
-        
-        return self.db.query(AuditLog).filter(
+
+        query = self.db.query(AuditLog).filter(
             AuditLog.user_id == user_id
-        ).order_by(AuditLog.created_at.desc()).offset(skip).limit(limit).all()
+        ).order_by(AuditLog.created_at.desc()).offset(skip).limit(limit)
+
+        if limit > 500:
+            # Large exports stream in server-side batches instead of
+            # materializing the whole result set at once
+            return list(
+                query.execution_options(stream_results=True).yield_per(500)
+            )
+        return query.all()
     
     def search_users(self, query: str, limit: int = 10) -> List[User]:
         """Search users by name or email"""
@@ -282,17 +339,20 @@ class UserService:
             User.username.ilike(f"%{query}%")
         )
         
-        return self.db.query(User).filter(
+        return self.db.query(User).options(load_only(*USER_LIST_COLS)).filter(
             and_(User.is_active == True, search_filter)
         ).limit(limit).all()
     
     def get_user_statistics(self) -> dict:
         """Get user statistics"""
         
-        total_users = self.db.query(User).count()
-        active_users = self.db.query(User).filter(User.is_active == True).count()
-        verified_users = self.db.query(User).filter(User.is_verified == True).count()
-        users_with_2fa = self.db.query(User).filter(User.is_2fa_enabled == True).count()
+        # Single scan with conditional aggregates instead of four COUNTs
+        total_users, active_users, verified_users, users_with_2fa = self.db.query(
+            func.count(User.id),
+            func.count(User.id).filter(User.is_active == True),
+            func.count(User.id).filter(User.is_verified == True),
+            func.count(User.id).filter(User.is_2fa_enabled == True)
+        ).one()
         
         return {
             "total_users": total_users,
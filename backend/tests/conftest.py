@@ -0,0 +1,98 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import deps
+from app.core.security import pwd_context
+from app.db.base_class import Base
+from app.main import app
+from app.middleware.rate_limiting import RateLimitMiddleware
+from app.services.auth_service import AuthService
+import app.db.init_db as init_db_module
+from tests.utils import TestingSessionLocal, engine
+
+
+def _override_get_db():
+    """Request-scoped session against the test engine"""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Route HTTP-level database access through the test engine, and point the
+# startup init_db seeding at it too so lifespan does not need Postgres
+app.dependency_overrides[deps.get_db] = _override_get_db
+init_db_module.SessionLocal = TestingSessionLocal
+
+# Drop bcrypt to its floor cost for the whole session: every test user
+# hash and wrong-password verify goes through the same code path at a
+# fraction of the production work factor
+pwd_context.update(bcrypt__rounds=4)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_schema():
+    """Build the test schema once per session"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def _fast_qr(monkeypatch):
+    """Skip QR PNG rendering during 2FA setup
+
+    The 2FA tests only assert the setup payload's shape; encoding a real
+    provisioning QR code is pure-CPU work they do not need.
+    """
+    class _StubQR:
+        def save(self, buffer, **kwargs):
+            buffer.write(b"stub")
+
+    monkeypatch.setattr(
+        "app.services.auth_service.segno.make", lambda *args, **kwargs: _StubQR()
+    )
+
+
+@pytest.fixture
+def audit_sink(monkeypatch):
+    """Collect audit events as plain dicts while they are written
+
+    Wraps AuthService._log_audit_event so tests can assert against a
+    Python list instead of querying the audit_logs table afterwards; the
+    real row is still persisted.
+    """
+    events = []
+    original = AuthService._log_audit_event
+
+    def wrapper(self, action, **kwargs):
+        events.append({"action": action, **kwargs})
+        return original(self, action, **kwargs)
+
+    monkeypatch.setattr(AuthService, "_log_audit_event", wrapper)
+    return events
+
+
+@pytest.fixture(autouse=True)
+def _reset_rate_limits():
+    """Empty the rate limiter's in-memory buckets between tests
+
+    Without Redis the middleware falls back to per-instance storage, so a
+    test that deliberately trips the login limit would otherwise 429 every
+    later test hitting the same endpoint from the same client IP.
+    """
+    yield
+    layer = app.middleware_stack
+    while layer is not None:
+        if isinstance(layer, RateLimitMiddleware):
+            layer.fallback_storage.clear()
+        layer = getattr(layer, "app", None)
+
+
+@pytest.fixture(scope="session")
+def client(test_schema):
+    """Shared TestClient: lifespan startup/shutdown runs once per session
+    and the ASGI transport is reused across every HTTP test"""
+    # localhost keeps TrustedHostMiddleware happy outside DEBUG mode
+    with TestClient(app, base_url="http://localhost") as c:
+        yield c
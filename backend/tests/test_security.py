@@ -1,21 +1,22 @@
 import pytest
-import time
-from fastapi.testclient import TestClient
+from datetime import timedelta
+from fastapi import HTTPException
+from jose import jwt as jose_jwt
+from freezegun import freeze_time
 from sqlalchemy.orm import Session
-from app.main import app
+from app.core.config import settings
 from app.core.security import (
     create_access_token, 
     verify_token, 
     get_password_hash, 
     verify_password,
-    validate_password_strength
+    validate_password_strength,
+    PasswordError
 )
-from app.models.user import User
+from app.models.user import User, UserSession
 from app.services.auth_service import AuthService
 from tests.utils import create_test_user, get_test_db
 
-client = TestClient(app)
-
 
 class TestPasswordSecurity:
     """Test password security features"""
@@ -34,67 +35,86 @@ class TestPasswordSecurity:
         # Wrong password should fail
         assert verify_password("WrongPassword", hashed) is False
     
-    def test_password_strength_validation(self):
-        """Test password strength requirements"""
-        
-        # Valid password
-        valid_password = "StrongPass123!"
-        is_valid, errors = validate_password_strength(valid_password)
+    def test_valid_password(self):
+        """Test that a strong password passes validation"""
+        is_valid, errors = validate_password_strength("StrongPass123!")
         assert is_valid is True
-        assert len(errors) == 0
-        
-        # Too short
-        short_password = "Short1!"
-        is_valid, errors = validate_password_strength(short_password)
-        assert is_valid is False
-        assert any("at least" in error for error in errors)
-        
-        # No uppercase
-        no_upper = "lowercase123!"
-        is_valid, errors = validate_password_strength(no_upper)
-        assert is_valid is False
-        assert any("uppercase" in error for error in errors)
-        
-        # No lowercase
-        no_lower = "UPPERCASE123!"
-        is_valid, errors = validate_password_strength(no_lower)
-        assert is_valid is False
-        assert any("lowercase" in error for error in errors)
-        
-        # No numbers
-        no_numbers = "NoNumbers!"
-        is_valid, errors = validate_password_strength(no_numbers)
-        assert is_valid is False
-        assert any("number" in error for error in errors)
-        
-        # No special characters
-        no_special = "NoSpecial123"
-        is_valid, errors = validate_password_strength(no_special)
-        assert is_valid is False
-        assert any("special" in error for error in errors)
-        
-        # Common weak password
-        weak_password = "password"
-        is_valid, errors = validate_password_strength(weak_password)
+        assert not errors
+
+    @pytest.mark.parametrize("password,expected", [
+        ("Short1!", PasswordError.TOO_SHORT),
+        ("lowercase123!", PasswordError.NO_UPPERCASE),
+        ("UPPERCASE123!", PasswordError.NO_LOWERCASE),
+        ("NoNumbers!", PasswordError.NO_NUMBER),
+        ("NoSpecial123", PasswordError.NO_SPECIAL),
+        ("password", PasswordError.COMMON),
+    ])
+    def test_password_strength_validation(self, password, expected):
+        """Test password strength requirements"""
+        is_valid, errors = validate_password_strength(password)
         assert is_valid is False
-        assert any("common" in error for error in errors)
+        assert expected in errors
+
+    def test_password_error_messages(self):
+        """Test that error flags still render user-facing messages"""
+        _, errors = validate_password_strength("password")
+        assert "Password is too common and easily guessable" in errors.messages
+
+
+@pytest.fixture(scope="module")
+def shared_user(test_db):
+    """One persisted user reused by tests that do not poison its state
+
+    Creating a user costs a bcrypt hash plus a commit; tests that only add
+    dependent rows (sessions, audit logs) or temporary 2FA state share
+    this one. Tests that lock or deactivate the account create their own.
+    """
+    return create_test_user(test_db)
+
+
+@pytest.fixture(scope="module")
+def valid_token():
+    """One signed access token shared by every verify-only test
+
+    Signing is paid once per module; tests that need expired or malformed
+    tokens still build their own.
+    """
+    return create_access_token(subject="test-user-id")
 
 
 class TestJWTSecurity:
     """Test JWT token security"""
-    
-    def test_token_creation_and_verification(self):
+
+    def test_token_creation_and_verification(self, valid_token):
         """Test JWT token creation and verification"""
-        user_id = "test-user-id"
-        
-        # Create access token
-        token = create_access_token(subject=user_id)
-        assert token is not None
-        
+        assert valid_token is not None
+
         # Verify token
-        verified_user_id = verify_token(token)
-        assert verified_user_id == user_id
+        verified_user_id = verify_token(valid_token)
+        assert verified_user_id == "test-user-id"
     
+    def test_token_verification_cached(self, monkeypatch):
+        """Test that repeat verification hits the cache"""
+        # Fresh token so the first call is guaranteed to be a cold decode
+        token = create_access_token(subject="cache-test-user")
+
+        # Count decodes instead of timing them: the second call must be
+        # served from the cache without touching jwt.decode at all
+        calls = []
+        real_decode = jose_jwt.decode
+
+        def counting_decode(*args, **kwargs):
+            calls.append(1)
+            return real_decode(*args, **kwargs)
+
+        monkeypatch.setattr("app.core.security.jwt.decode", counting_decode)
+
+        first = verify_token(token)
+        second = verify_token(token)
+
+        assert first == second == "cache-test-user"
+        assert len(calls) == 1
+
     def test_invalid_token_verification(self):
         """Test verification of invalid tokens"""
         
@@ -113,32 +133,31 @@ class TestJWTSecurity:
     
     def test_token_expiration(self):
         """Test token expiration"""
-        from datetime import timedelta
-        
         user_id = "test-user-id"
-        
-        # Create token with very short expiration
-        token = create_access_token(
-            subject=user_id, 
-            expires_delta=timedelta(seconds=1)
-        )
-        
-        # Token should be valid immediately
-        result = verify_token(token)
-        assert result == user_id
-        
-        # Wait for token to expire
-        time.sleep(2)
-        
-        # Token should now be invalid
-        result = verify_token(token)
-        assert result is None
+
+        with freeze_time() as frozen:
+            # Create token with very short expiration
+            token = create_access_token(
+                subject=user_id,
+                expires_delta=timedelta(seconds=1)
+            )
+
+            # Token should be valid immediately
+            result = verify_token(token)
+            assert result == user_id
+
+            # Jump past the expiry instead of sleeping through it
+            frozen.tick(timedelta(seconds=2))
+
+            # Token should now be invalid
+            result = verify_token(token)
+            assert result is None
 
 
 class TestAuthenticationSecurity:
     """Test authentication security features"""
     
-    def test_login_rate_limiting(self):
+    def test_login_rate_limiting(self, client):
         """Test login rate limiting"""
         # This would require a test Redis instance
         # For now, we'll test the endpoint exists and handles rate limiting
@@ -153,7 +172,11 @@ class TestAuthenticationSecurity:
         for _ in range(10):
             response = client.post("/api/v1/auth/login", json=login_data)
             responses.append(response.status_code)
-        
+            # The first 429 proves the limiter kicked in; every further
+            # request would just burn a bcrypt verify and a DB round-trip
+            if response.status_code == 429:
+                break
+
         # Should have some 429 (Too Many Requests) responses
         assert 429 in responses or all(r == 401 for r in responses)
     
@@ -162,34 +185,38 @@ class TestAuthenticationSecurity:
         # Create test user
         user = create_test_user(test_db)
         auth_service = AuthService(test_db)
-        
-        # Multiple failed login attempts
-        for _ in range(6):  # Exceed MAX_LOGIN_ATTEMPTS (5)
-            result = auth_service.authenticate_user(
-                email=user.email,
-                password="wrongpassword"
-            )
-            assert result is None
-        
-        # User should now be locked
-        user_after_attempts = test_db.query(User).filter(User.id == user.id).first()
-        assert user_after_attempts.is_locked is True
-        
-        # Even correct password should fail when locked
+
+        # Drive the counter to one below the limit directly; repeated real
+        # wrong-password calls would just re-pay the bcrypt verify without
+        # exercising any behaviour the final attempt does not cover
+        user.failed_login_attempts = settings.MAX_LOGIN_ATTEMPTS - 1
+        test_db.commit()
+
+        # One real failed attempt crosses the threshold and locks the account
         result = auth_service.authenticate_user(
             email=user.email,
-            password="testpassword123"
+            password="wrongpassword"
         )
         assert result is None
+
+        test_db.refresh(user)
+        assert user.is_locked is True
+
+        # Even the correct password is rejected while locked
+        with pytest.raises(HTTPException) as exc_info:
+            auth_service.authenticate_user(
+                email=user.email,
+                password="testpassword123"
+            )
+        assert exc_info.value.status_code == 423
     
-    def test_session_security(self, test_db: Session):
+    def test_session_security(self, test_db: Session, shared_user):
         """Test session security features"""
-        user = create_test_user(test_db)
         auth_service = AuthService(test_db)
         
         # Create session
         access_token, refresh_token = auth_service.create_user_session(
-            user=user,
+            user=shared_user,
             ip_address="192.168.1.1",
             user_agent="Test Browser"
         )
@@ -198,13 +225,12 @@ class TestAuthenticationSecurity:
         assert refresh_token is not None
         
         # Verify session exists
-        from app.models.user import UserSession
         session = test_db.query(UserSession).filter(
             UserSession.refresh_token == refresh_token
         ).first()
         
         assert session is not None
-        assert session.user_id == user.id
+        assert session.user_id == shared_user.id
         assert session.ip_address == "192.168.1.1"
         assert session.user_agent == "Test Browser"
 
@@ -212,28 +238,15 @@ class TestAuthenticationSecurity:
 class TestAPIEndpointSecurity:
     """Test API endpoint security"""
     
-    def test_protected_endpoints_require_auth(self):
-        """Test that protected endpoints require authentication"""
-        
-        # Try to access protected endpoint without token
-        response = client.get("/api/v1/auth/me")
-        assert response.status_code == 401
-        
-        # Try to access users endpoint without token
-        response = client.get("/api/v1/users/")
-        assert response.status_code == 401
-    
-    def test_invalid_token_rejection(self):
-        """Test rejection of invalid tokens"""
-        
-        # Invalid token format
-        headers = {"Authorization": "Bearer invalid-token"}
-        response = client.get("/api/v1/auth/me", headers=headers)
-        assert response.status_code == 401
-        
-        # Missing Bearer prefix
-        headers = {"Authorization": "invalid-token"}
-        response = client.get("/api/v1/auth/me", headers=headers)
+    @pytest.mark.parametrize("method,path,headers", [
+        ("GET", "/api/v1/auth/me", None),                                    # no token
+        ("GET", "/api/v1/users/", None),                                     # no token
+        ("GET", "/api/v1/auth/me", {"Authorization": "Bearer invalid-token"}),  # bad token
+        ("GET", "/api/v1/auth/me", {"Authorization": "invalid-token"}),      # missing Bearer prefix
+    ])
+    def test_unauthenticated_requests_rejected(self, client, method, path, headers):
+        """Test that protected endpoints reject missing or invalid credentials"""
+        response = client.request(method, path, headers=headers or {})
         assert response.status_code == 401
     
     def test_permission_based_access(self, test_db: Session):
@@ -242,7 +255,7 @@ class TestAPIEndpointSecurity:
         # and testing access to various endpoints
         pass
     
-    def test_input_validation(self):
+    def test_input_validation(self, client):
         """Test input validation security"""
         
         # Test SQL injection attempts
@@ -267,28 +280,30 @@ class TestAPIEndpointSecurity:
         assert response.status_code in [400, 422]
 
 
+# Exact header values every response must carry
+EXPECTED_SECURITY_HEADERS = {
+    "x-content-type-options": "nosniff",
+    "x-frame-options": "DENY",
+    "x-xss-protection": "1; mode=block",
+}
+
+
 class TestSecurityHeaders:
     """Test security headers"""
-    
-    def test_security_headers_present(self):
+
+    def test_security_headers_present(self, client):
         """Test that security headers are present in responses"""
-        
+
         response = client.get("/health")
-        
-        # Check for security headers
-        assert "X-Content-Type-Options" in response.headers
-        assert response.headers["X-Content-Type-Options"] == "nosniff"
-        
-        assert "X-Frame-Options" in response.headers
-        assert response.headers["X-Frame-Options"] == "DENY"
-        
-        assert "X-XSS-Protection" in response.headers
-        assert response.headers["X-XSS-Protection"] == "1; mode=block"
-        
-        assert "Referrer-Policy" in response.headers
-        assert "Content-Security-Policy" in response.headers
+
+        # One subset comparison: a failure shows the whole header diff
+        headers = {k.lower(): v for k, v in response.headers.items()}
+        assert EXPECTED_SECURITY_HEADERS.items() <= headers.items()
+
+        assert "referrer-policy" in headers
+        assert "content-security-policy" in headers
     
-    def test_cors_configuration(self):
+    def test_cors_configuration(self, client):
         """Test CORS configuration"""
         
         # Test preflight request
@@ -308,101 +323,105 @@ class TestSecurityHeaders:
 class TestTwoFactorAuthentication:
     """Test 2FA security"""
     
-    def test_2fa_setup_requires_auth(self):
+    def test_2fa_setup_requires_auth(self, client):
         """Test that 2FA setup requires authentication"""
         
         response = client.post("/api/v1/auth/2fa/setup")
         assert response.status_code == 401
     
-    def test_2fa_verification_flow(self, test_db: Session):
+    def test_2fa_verification_flow(self, test_db: Session, shared_user, monkeypatch):
         """Test 2FA verification flow"""
-        user = create_test_user(test_db)
         auth_service = AuthService(test_db)
-        
+
+        # Deterministic secret and backup codes: this test only checks the
+        # payload shape, so the CSPRNG draws are stubbed out and the
+        # setup result becomes reproducible
+        monkeypatch.setattr(
+            "app.services.auth_service.pyotp.random_base32",
+            lambda: "JBSWY3DPEHPK3PXP"
+        )
+        monkeypatch.setattr(
+            "app.services.auth_service.secrets.token_bytes",
+            lambda n: b"\x00" * n
+        )
+
         # Setup 2FA
-        setup_data = auth_service.setup_2fa(user)
-        
-        assert "secret" in setup_data
+        setup_data = auth_service.setup_2fa(shared_user)
+
+        assert setup_data["secret"] == "JBSWY3DPEHPK3PXP"
         assert "qr_code" in setup_data
-        assert "backup_codes" in setup_data
-        
+        assert setup_data["backup_codes"] == ["00000000"] * 10
+
         # Verify with invalid code should fail
-        result = auth_service.verify_2fa_setup(user, "000000")
+        result = auth_service.verify_2fa_setup(shared_user, "000000")
         assert result is False
         
         # User should not have 2FA enabled yet
-        test_db.refresh(user)
-        assert user.is_2fa_enabled is False
+        test_db.refresh(shared_user)
+        assert shared_user.is_2fa_enabled is False
 
 
 class TestAuditLogging:
     """Test audit logging security"""
     
-    def test_login_events_logged(self, test_db: Session):
+    def test_login_events_logged(self, test_db: Session, shared_user, audit_sink):
         """Test that login events are properly logged"""
-        user = create_test_user(test_db)
         auth_service = AuthService(test_db)
-        
+
         # Successful login
         authenticated_user = auth_service.authenticate_user(
-            email=user.email,
+            email=shared_user.email,
             password="testpassword123",
             ip_address="192.168.1.1",
             user_agent="Test Browser"
         )
-        
+
         assert authenticated_user is not None
-        
-        # Check audit log
-        from app.models.user import AuditLog
-        audit_log = test_db.query(AuditLog).filter(
-            AuditLog.user_id == user.id,
-            AuditLog.action == "login_success"
-        ).first()
-        
-        assert audit_log is not None
-        assert audit_log.ip_address == "192.168.1.1"
-        assert audit_log.user_agent == "Test Browser"
-        assert audit_log.status == "success"
-    
-    def test_failed_login_logged(self, test_db: Session):
+
+        # Check the collected audit events
+        assert any(
+            event["action"] == "login_success"
+            and event["user_id"] == shared_user.id
+            and event["ip_address"] == "192.168.1.1"
+            and event["user_agent"] == "Test Browser"
+            for event in audit_sink
+        )
+
+    def test_failed_login_logged(self, test_db: Session, shared_user, audit_sink):
         """Test that failed login attempts are logged"""
-        user = create_test_user(test_db)
         auth_service = AuthService(test_db)
-        
+
         # Failed login
         result = auth_service.authenticate_user(
-            email=user.email,
+            email=shared_user.email,
             password="wrongpassword",
             ip_address="192.168.1.1"
         )
-        
+
         assert result is None
-        
-        # Check audit log
-        from app.models.user import AuditLog
-        audit_log = test_db.query(AuditLog).filter(
-            AuditLog.user_id == user.id,
-            AuditLog.action == "login_failed"
-        ).first()
-        
-        assert audit_log is not None
-        assert audit_log.status == "failure"
+
+        # Check the collected audit events
+        assert any(
+            event["action"] == "login_failed"
+            and event["user_id"] == shared_user.id
+            and event["status"] == "failure"
+            for event in audit_sink
+        )
 
 
 # Fixtures and utilities would be in conftest.py
-@pytest.fixture
+@pytest.fixture(scope="module")
 def test_db():
     """Provide test database session"""
-    return get_test_db()
+    db = get_test_db()
+    yield db
+    db.close()
 
 
 def test_overall_security_configuration():
     """Test overall security configuration"""
     
     # Test that debug mode is properly configured
-    from app.core.config import settings
-    
     # In production, debug should be False
     if not settings.DEBUG:
         assert settings.SECRET_KEY != "default-secret-key"
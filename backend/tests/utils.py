@@ -1,31 +1,84 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import sessionmaker, Session
 from app.db.base_class import Base
 from app.models.user import User, Role, Permission
 from app.core.security import get_password_hash
-import uuid
+import itertools
+import sqlite3
 
 # Test database URL (use in-memory SQLite for tests)
-TEST_DATABASE_URL = "sqlite:///./test.db"
+TEST_DATABASE_URL = "sqlite://"
 
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+# StaticPool pins every session to the single in-memory connection, so the
+# schema survives across sessions and nothing touches the filesystem
+engine = create_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+@event.listens_for(engine, "connect")
+def _fast_sqlite(dbapi_conn, _record):
+    """Strip durability bookkeeping from the throwaway test database"""
+    cursor = dbapi_conn.cursor()
+    for pragma in (
+        "synchronous=OFF",
+        "journal_mode=MEMORY",
+        "temp_store=MEMORY",
+        "locking_mode=EXCLUSIVE",
+    ):
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+
+
+# Build the schema once at import; sessions only ever reuse it
+Base.metadata.create_all(bind=engine)
+
+# Pristine copy of the schema, used to stamp out fresh databases below.
+# create_all runs exactly once against this reference connection.
+_schema_reference = sqlite3.connect(":memory:", check_same_thread=False)
+Base.metadata.create_all(
+    bind=create_engine(
+        "sqlite://", creator=lambda: _schema_reference, poolclass=StaticPool
+    )
+)
+
+
+def fresh_engine():
+    """Engine over a new in-memory database with the schema pre-loaded
+
+    SQLite's backup API copies the reference schema page-by-page, which is
+    far cheaper than re-running create_all, so tests that need an isolated
+    database can get one without paying DDL introspection again.
+    """
+    target = sqlite3.connect(":memory:", check_same_thread=False)
+    _schema_reference.backup(target)
+    return create_engine(
+        "sqlite://", creator=lambda: target, poolclass=StaticPool
+    )
+
+
 def get_test_db() -> Session:
     """Get test database session"""
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    try:
-        return db
-    finally:
-        db.close()
+    return TestingSessionLocal()
+
+
+# Monotonic counter for unique-per-process test emails; cheaper than
+# uuid4 and guarantees no UNIQUE collisions between tests sharing the DB
+_email_counter = itertools.count()
+
+
+def _fresh_email() -> str:
+    return f"user{next(_email_counter)}@example.com"
 
 
 def create_test_user(db: Session, **kwargs) -> User:
     """Create a test user"""
     user_data = {
-        "email": "test@example.com",
+        "email": _fresh_email(),
         "first_name": "Test",
         "last_name": "User",
         "hashed_password": get_password_hash("testpassword123"),
@@ -41,6 +94,34 @@ def create_test_user(db: Session, **kwargs) -> User:
     return user
 
 
+def create_test_users_bulk(db: Session, specs: list[dict]) -> list[User]:
+    """Create several test users in a single flush
+
+    Each spec is a dict of User column overrides; unlike the single-user
+    helper this batches all inserts into one transaction instead of one
+    commit per row.
+    """
+    hashed_password = get_password_hash("testpassword123")
+    users = []
+    for i, spec in enumerate(specs):
+        user_data = {
+            "email": _fresh_email(),
+            "first_name": "Test",
+            "last_name": f"User{i}",
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_verified": True,
+            **spec
+        }
+        users.append(User(**user_data))
+
+    db.add_all(users)
+    db.commit()
+    for user in users:
+        db.refresh(user)
+    return users
+
+
 def create_test_role(db: Session, **kwargs) -> Role:
     """Create a test role"""
     role_data = {